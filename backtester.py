@@ -1,24 +1,135 @@
-import pandas as pd
+import os
+import hashlib
+import warnings
 import numpy as np
+from numba import njit
+
+from signals import next_position
+from portfolio import position_scale
+from metrics import drawdown_step
+
+# Modules whose @njit code is compiled into the AOT build
+KERNEL_SOURCES = ('backtester.py', 'signals.py', 'portfolio.py', 'metrics.py')
+
+def kernel_source_digest():
+    digest = hashlib.sha1()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in KERNEL_SOURCES:
+        with open(os.path.join(src_dir, name), 'rb') as f:
+            digest.update(f.read())
+    # Truncated to fit the int64 the AOT module can return
+    return int(digest.hexdigest()[:15], 16)
+
+# Ahead-of-time build of the backtest kernels (see build_kernels.py); skips JIT warmup.
+# A build from older sources would silently diverge from the JIT kernels, so it is ignored.
+try:
+    import _mars_kernels
+except ImportError:
+    _mars_kernels = None
+else:
+    if _mars_kernels.source_digest() != kernel_source_digest():
+        warnings.warn("_mars_kernels was built from different kernel sources; rerun build_kernels.py. Using JIT.")
+        _mars_kernels = None
+
+@njit(cache=True)
+def step_return(prev_price, price, prev_weight, weight, transaction_cost):
+    # Return on the weight held into this row, net of the cost of trading to the new weight
+    r = price / prev_price - 1.0
+    traded = abs(weight - prev_weight)
+    gross = prev_weight * r if not np.isnan(r) else 0.0
+    return gross - transaction_cost * traded, traded
+
+@njit(cache=True)
+def compound(net_returns, initial_capital):
+    # Compound equity and track drawdown in one row sweep
+    n_rows = net_returns.shape[0]
+    equity_curve = np.empty(n_rows)
+    equity = initial_capital
+    running_max = -np.inf
+    max_dd = np.nan
+    for i in range(n_rows):
+        equity *= 1.0 + net_returns[i]
+        equity_curve[i] = equity
+        # Same drawdown rule as metrics.max_drawdown, so both paths agree on degenerate input
+        running_max, max_dd = drawdown_step(equity, running_max, max_dd)
+    return equity_curve, max_dd
+
+@njit(cache=True)
+def backtest_kernel(prices, weights, initial_capital, transaction_cost):
+    n_rows, n_cols = prices.shape
+    net_returns = np.zeros(n_rows)
+    turnover = np.zeros(n_rows)
+    # Column-outer sweep so each asset's prices and weights are read contiguously
+    for j in range(n_cols):
+        # Previous row carried in registers: one read per price and weight
+        prev_price = np.float64(prices[0, j])
+        prev_weight = np.float64(weights[0, j])
+        for i in range(1, n_rows):
+            price = np.float64(prices[i, j])
+            weight = np.float64(weights[i, j])
+            net, traded = step_return(prev_price, price, prev_weight, weight, transaction_cost)
+            net_returns[i] += net
+            turnover[i] += traded
+            prev_price = price
+            prev_weight = weight
+    equity_curve, max_dd = compound(net_returns, initial_capital)
+    return equity_curve, net_returns, turnover, max_dd
 
 def backtest(prices, weights, initial_capital, transaction_cost):
-    daily_returns = prices.pct_change().fillna(0)
-    portfolio_returns = (weights.shift(1) * daily_returns).sum(axis=1)
-    turnover = (weights.diff().abs()).sum(axis=1)
-    costs = turnover * transaction_cost
-    net_returns = portfolio_returns - costs
-    equity_curve = (1 + net_returns).cumprod() * initial_capital
-    return equity_curve, net_returns, turnover
+    # The AOT build is compiled for float32 prices and weights only and does no type checking
+    if _mars_kernels is not None and prices.dtype == np.float32 and weights.dtype == np.float32:
+        kernel = _mars_kernels.backtest_kernel
+    else:
+        kernel = backtest_kernel
+    return kernel(prices, weights, float(initial_capital), float(transaction_cost))
+
+@njit(cache=True)
+def fused_backtest_kernel(prices, zscores, entry_z, exit_z, max_position_size, initial_capital, transaction_cost):
+    n_rows, n_cols = prices.shape
+    # Per-asset state only: signals and weights are never materialized as T x N matrices
+    position = np.zeros(n_cols, dtype=np.int8)
+    prev_price = np.zeros(n_cols)
+    prev_weight = np.zeros(n_cols)
+    net_returns = np.zeros(n_rows)
+    turnover = np.zeros(n_rows)
+    for i in range(n_rows):
+        active = 0
+        for j in range(n_cols):
+            position[j] = next_position(position[j], zscores[i, j], entry_z, exit_z)
+            active += abs(position[j])
+        scale = position_scale(active, max_position_size)
+        net_total = 0.0
+        traded_total = 0.0
+        for j in range(n_cols):
+            price = np.float64(prices[i, j])
+            weight = np.float64(np.float32(position[j]) * scale)
+            if i > 0:
+                net, traded = step_return(prev_price[j], price, prev_weight[j], weight, transaction_cost)
+                net_total += net
+                traded_total += traded
+            prev_price[j] = price
+            prev_weight[j] = weight
+        net_returns[i] = net_total
+        turnover[i] = traded_total
+    equity_curve, max_dd = compound(net_returns, initial_capital)
+    return equity_curve, net_returns, turnover, max_dd
+
+def fused_backtest(prices, zscores, entry_z, exit_z, max_position_size, initial_capital, transaction_cost):
+    args = (float(entry_z), float(exit_z), float(max_position_size), float(initial_capital), float(transaction_cost))
+    if _mars_kernels is not None and prices.dtype == np.float32 and zscores.dtype == np.float64:
+        return _mars_kernels.fused_backtest_kernel(prices, zscores, *args)
+    return fused_backtest_kernel(prices, zscores, *args)
 
 if __name__ == "__main__":
     import data_loader
     import signals as sig
     import portfolio as pf
+    import pandas as pd
     config = data_loader.load_config()
     data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = data_loader.preprocess_data(data)
-    zscores = sig.compute_zscore(data, config['lookback_window'])
+    zscores = sig.compute_zscore(data.arr, config['lookback_window'])
     signals = sig.generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
     weights = pf.position_sizing(signals, config['max_position_size'])
-    eq, net_ret, turnover = backtest(data, weights, config['initial_capital'], config['transaction_cost'])
-    print(eq.tail())
+    eq, net_ret, turnover, max_dd = backtest(data.arr, weights, config['initial_capital'], config['transaction_cost'])
+    print(pd.Series(eq, index=data.index).tail())
@@ -0,0 +1,38 @@
+"""
+build_kernels.py - Ahead-of-time compilation of the Numba hot kernels
+
+Compiles backtest_kernel and fused_backtest_kernel into the _mars_kernels
+extension module next to this file. backtester.py imports it when present
+and falls back to JIT otherwise. The prange kernels in signals.py are not
+exported: pycc compiles prange as a plain serial loop, which would give up
+their multi-core speedup, so they always run through the JIT.
+
+The module also exports source_digest, a hash of the kernel sources taken
+at build time. backtester.py ignores a build whose digest no longer
+matches, so editing a kernel or a helper it calls without rebuilding falls
+back to JIT rather than running stale code.
+
+Usage: python build_kernels.py
+"""
+
+import os
+from numba.pycc import CC
+
+import backtester as bt
+
+cc = CC('_mars_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export('backtest_kernel', 'Tuple((f8[:], f8[:], f8[:], f8))(f4[:,:], f4[:,:], f8, f8)')(bt.backtest_kernel.py_func)
+cc.export('fused_backtest_kernel', 'Tuple((f8[:], f8[:], f8[:], f8))(f4[:,:], f8[:,:], f8, f8, f8, f8, f8)')(
+    bt.fused_backtest_kernel.py_func
+)
+
+_source_digest = bt.kernel_source_digest()
+
+@cc.export('source_digest', 'i8()')
+def source_digest():
+    return _source_digest
+
+if __name__ == "__main__":
+    cc.compile()
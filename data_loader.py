@@ -1,21 +1,71 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import yaml
 
+CACHE_DIR = os.path.expanduser(os.path.join('~', '.cache', 'mars'))
+CACHE_TTL_HOURS = 24
+
+@dataclass
+class PriceMatrix:
+    arr: np.ndarray
+    index: pd.Index
+    columns: pd.Index
+
+    @classmethod
+    def from_frame(cls, data):
+        return cls(np.asfortranarray(data.to_numpy(dtype=np.float32)), data.index, data.columns)
+
+    def to_frame(self, values=None):
+        return pd.DataFrame(self.arr if values is None else values, index=self.index, columns=self.columns)
+
 def load_config(config_path='config.yaml'):
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
 
-def fetch_data(assets, start_date, end_date):
-    data = yf.download(assets, start=start_date, end=end_date)['Adj Close']
+def cache_is_fresh(path, ttl_hours=CACHE_TTL_HOURS):
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl_hours * 3600
+
+def _cache_path(ticker, start_date, end_date):
+    return os.path.join(CACHE_DIR, f"{ticker}_{start_date}_{end_date}.parquet")
+
+def fetch_ticker(ticker, start_date, end_date, cache_ttl_hours=CACHE_TTL_HOURS):
+    path = _cache_path(ticker, start_date, end_date)
+    if cache_is_fresh(path, cache_ttl_hours):
+        return pd.read_parquet(path)[ticker]
+    data = yf.download(ticker, start=start_date, end=end_date, progress=False, threads=False)['Adj Close']
+    if isinstance(data, pd.DataFrame):
+        data = data.iloc[:, 0]
+    data = data.rename(ticker)
+    # yfinance logs failed tickers and returns an empty placeholder instead of raising;
+    # caching that would pin the gap until the TTL expires, so it is retried next run
+    if data.isna().all():
+        logging.warning(f"No price data returned for {ticker}; it will be refetched on the next run")
+        return data
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data.to_frame().to_parquet(path)
+    return data
+
+def fetch_data(assets, start_date, end_date, cache_ttl_hours=CACHE_TTL_HOURS):
+    # Cached per ticker only (see fetch_ticker), so baskets share snapshots and a failed ticker is retried alone
+    with ThreadPoolExecutor(max_workers=min(16, len(assets))) as executor:
+        results = list(executor.map(lambda t: fetch_ticker(t, start_date, end_date, cache_ttl_hours), assets))
+    data = pd.concat(results, axis=1)
     data = data.dropna(how='all')
     return data
 
 def preprocess_data(data):
-    return data.fillna(method='ffill').fillna(method='bfill')
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    return PriceMatrix.from_frame(data.ffill().bfill())
 
 if __name__ == "__main__":
     config = load_config()
     data = fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = preprocess_data(data)
-    print(data.head())
+    print(data.to_frame().head())
@@ -17,9 +17,14 @@ import sys
 import os
 import logging
 import datetime
+import multiprocessing as mp
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import yaml
 import pandas as pd
 import numpy as np
+import numba
 
 import data_loader
 import signals as sig
@@ -44,26 +49,35 @@ def parse_args():
     parser.add_argument('--start_date', type=str, help='Override start date (YYYY-MM-DD)')
     parser.add_argument('--end_date', type=str, help='Override end date (YYYY-MM-DD)')
     parser.add_argument('--assets', type=str, nargs='+', help='Override asset list')
-    parser.add_argument('--plot', action='store_true', help='Show plots interactively')
+    parser.add_argument('--plot', action='store_true', help='Render plots to PNG files under out/')
     parser.add_argument('--export', type=str, default='', help='Export results to CSV (provide filename)')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Backtest every (lookback, entry_z, exit_z) point of the sweep grid in parallel')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose logging')
     return parser.parse_args()
 
-def validate_config(config):
-    required_keys = [
-        'assets', 'start_date', 'end_date', 'initial_capital',
-        'lookback_window', 'entry_zscore', 'exit_zscore',
-        'max_position_size', 'transaction_cost'
-    ]
-    for key in required_keys:
+REQUIRED_KEYS = [
+    'assets', 'start_date', 'end_date', 'initial_capital',
+    'lookback_window', 'entry_zscore', 'exit_zscore',
+    'max_position_size', 'transaction_cost'
+]
+
+def check_config(config):
+    for key in REQUIRED_KEYS:
         if key not in config:
             raise ValueError(f"Missing required config key: {key}")
     # Additional validation
     assert isinstance(config['assets'], list) and len(config['assets']) > 0, "Assets list must not be empty."
     assert config['initial_capital'] > 0, "Initial capital must be positive."
-    assert config['lookback_window'] > 0, "Lookback window must be positive."
+    # The rolling kernels index arr[i - window] without bounds checks, so the window must be a real integer >= 2
+    assert isinstance(config['lookback_window'], (int, np.integer)) and config['lookback_window'] >= 2, \
+        "Lookback window must be an integer >= 2."
+    assert config['entry_zscore'] >= 0 and config['exit_zscore'] >= 0, "Entry and exit z-scores must be non-negative."
     assert config['max_position_size'] > 0 and config['max_position_size'] <= 1, "max_position_size must be in (0, 1]."
     assert 0 <= config['transaction_cost'] < 0.01, "Transaction cost should be reasonable (0 <= x < 0.01)."
+
+def validate_config(config):
+    check_config(config)
     logging.info("Config validated successfully.")
 
 def apply_overrides(config, args):
@@ -106,14 +120,19 @@ def print_backtest_summary(equity_curve, net_returns, turnover):
     logging.info(f"  Std daily return: {net_returns.std():.5f}")
     logging.info(f"  Average daily turnover: {turnover.mean():.5f}")
 
-def print_metrics_summary(net_returns, equity_curve):
-    sharpe = mt.sharpe_ratio(net_returns)
-    max_dd = mt.max_drawdown(equity_curve)
-    win = mt.win_rate(net_returns)
+def compute_metrics(net_returns, equity_curve, max_dd=None):
+    # The backtest kernels already return max_dd; recompute it only for curves from elsewhere
+    if max_dd is None:
+        max_dd = mt.max_drawdown(equity_curve)
+    return mt.performance_metrics(net_returns, max_dd)
+
+def print_metrics_summary(net_returns, equity_curve, max_dd=None):
+    metrics = compute_metrics(net_returns, equity_curve, max_dd)
     logging.info("Performance Metrics:")
-    logging.info(f"  Sharpe Ratio: {sharpe:.3f}")
-    logging.info(f"  Max Drawdown: {100 * max_dd:.2f}%")
-    logging.info(f"  Win Rate: {100 * win:.2f}%")
+    logging.info(f"  Sharpe Ratio: {metrics['sharpe']:.3f}")
+    logging.info(f"  Max Drawdown: {100 * metrics['max_drawdown']:.2f}%")
+    logging.info(f"  Win Rate: {100 * metrics['win_rate']:.2f}%")
+    return metrics
 
 def export_results(equity_curve, net_returns, turnover, filename):
     df = pd.DataFrame({
@@ -126,33 +145,45 @@ def export_results(equity_curve, net_returns, turnover, filename):
 
 def run_pipeline(config, show_plots=False, export_file=''):
     # Step 1: Load and preprocess data
-    data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
+    data = data_loader.fetch_data(
+        config['assets'], config['start_date'], config['end_date'],
+        config.get('cache_ttl_hours', data_loader.CACHE_TTL_HOURS)
+    )
     data = data_loader.preprocess_data(data)
-    print_data_summary(data)
+    print_data_summary(data.to_frame())
+    logging.debug(f"Numba kernel threads: {numba.get_num_threads()}")
 
     # Step 2: Compute z-score signals
-    zscores = sig.compute_zscore(data, config['lookback_window'])
+    zscores = sig.compute_zscore(data.arr, config['lookback_window'])
     signals = sig.generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
-    print_signals_summary(signals)
+    print_signals_summary(data.to_frame(signals))
 
     # Step 3: Portfolio weights
     weights = pf.position_sizing(signals, config['max_position_size'])
-    print_weights_summary(weights)
+    print_weights_summary(data.to_frame(weights))
 
     # Step 4: Backtest
-    equity_curve, net_returns, turnover = bt.backtest(
-        data, weights, config['initial_capital'], config['transaction_cost']
+    equity_curve, net_returns, turnover, max_dd = bt.backtest(
+        data.arr, weights, config['initial_capital'], config['transaction_cost']
     )
+    equity_curve = pd.Series(equity_curve, index=data.index)
+    net_returns = pd.Series(net_returns, index=data.index)
+    turnover = pd.Series(turnover, index=data.index)
     print_backtest_summary(equity_curve, net_returns, turnover)
 
     # Step 5: Metrics
-    print_metrics_summary(net_returns, equity_curve)
+    metrics = print_metrics_summary(net_returns, equity_curve, max_dd)
 
     # Step 6: Visualization
     if show_plots:
-        vz.plot_equity_curve(equity_curve)
-        vz.plot_drawdown(equity_curve)
-        vz.plot_signal_heatmap(signals)
+        run_id = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        for plot_fn, plot_data, name in [
+            (vz.plot_equity_curve, equity_curve, 'equity_curve'),
+            (vz.plot_drawdown, equity_curve, 'drawdown'),
+            (vz.plot_signal_heatmap, data.to_frame(signals), 'signal_heatmap'),
+        ]:
+            path = vz.save_plot(plot_fn, plot_data, f"{name}_{run_id}")
+            logging.info(f"Saved {name} plot to {path}")
 
     # Step 7: Export
     if export_file:
@@ -160,6 +191,101 @@ def run_pipeline(config, show_plots=False, export_file=''):
 
     # Step 8: Report summary
     logging.info("Pipeline completed successfully.")
+    return metrics
+
+SWEEP_KEYS = ('lookback_window', 'entry_zscore', 'exit_zscore')
+
+DEFAULT_SWEEP_GRID = {
+    'lookback_window': [10, 20, 40],
+    'entry_zscore': [1.0, 1.5, 2.0],
+    'exit_zscore': [0.0, 0.5],
+}
+
+def apply_thread_limit():
+    # The prange kernels honour OMP_NUM_THREADS unless NUMBA_NUM_THREADS is set explicitly.
+    # Nested specs like "4,2" use their outer level; non-integer values are ignored.
+    if 'NUMBA_NUM_THREADS' in os.environ:
+        return
+    first = os.environ.get('OMP_NUM_THREADS', '').split(',')[0].strip()
+    if not first.isdigit() or int(first) < 1:
+        return
+    numba.set_num_threads(min(int(first), numba.config.NUMBA_NUM_THREADS))
+
+# Per-process view of the shared price matrix, attached by _init_sweep_worker
+_sweep_shm = None
+_sweep_prices = None
+
+def _init_sweep_worker(shm_name, shape, dtype):
+    global _sweep_shm, _sweep_prices
+    # Parallelism comes from the process pool; one kernel thread per worker avoids oversubscription
+    numba.set_num_threads(1)
+    _sweep_shm = shared_memory.SharedMemory(name=shm_name)
+    _sweep_prices = np.ndarray(shape, dtype=dtype, buffer=_sweep_shm.buf, order='F')
+
+def _run_sweep_point(config):
+    # Sweeps only need the metrics, so signals and weights are streamed inside the backtest
+    zscores = sig.compute_zscore(_sweep_prices, config['lookback_window'])
+    equity_curve, net_returns, turnover, max_dd = bt.fused_backtest(
+        _sweep_prices, zscores, config['entry_zscore'], config['exit_zscore'],
+        config['max_position_size'], config['initial_capital'], config['transaction_cost']
+    )
+    metrics = compute_metrics(net_returns, equity_curve, max_dd)
+    metrics['total_return'] = equity_curve[-1] / equity_curve[0] - 1
+    metrics['avg_turnover'] = turnover.mean()
+    return {
+        'lookback_window': config['lookback_window'],
+        'entry_zscore': config['entry_zscore'],
+        'exit_zscore': config['exit_zscore'],
+        **metrics
+    }
+
+def run_sweep(config, grid, export_file=''):
+    for key in SWEEP_KEYS:
+        if key not in grid:
+            raise ValueError(f"Missing sweep grid key: {key}")
+    points = [
+        dict(config, lookback_window=lb, entry_zscore=ez, exit_zscore=xz)
+        for lb, ez, xz in itertools.product(*(grid[key] for key in SWEEP_KEYS))
+    ]
+    # Reject bad grid values up front: in a worker they would kill the pool or read out of bounds
+    for point in points:
+        try:
+            check_config(point)
+        except (ValueError, AssertionError) as e:
+            params = {key: point[key] for key in SWEEP_KEYS}
+            raise ValueError(f"Invalid sweep point {params}: {e}") from e
+
+    data = data_loader.fetch_data(
+        config['assets'], config['start_date'], config['end_date'],
+        config.get('cache_ttl_hours', data_loader.CACHE_TTL_HOURS)
+    )
+    data = data_loader.preprocess_data(data)
+    print_data_summary(data.to_frame())
+    logging.info(f"Running parameter sweep over {len(points)} grid points.")
+
+    # Load prices once and share them with every worker instead of pickling per task
+    shm = shared_memory.SharedMemory(create=True, size=data.arr.nbytes)
+    try:
+        shared = np.ndarray(data.arr.shape, dtype=data.arr.dtype, buffer=shm.buf, order='F')
+        shared[:] = data.arr
+        del shared
+        with ProcessPoolExecutor(
+            mp_context=mp.get_context('spawn'),
+            initializer=_init_sweep_worker,
+            initargs=(shm.name, data.arr.shape, data.arr.dtype.str)
+        ) as executor:
+            futures = [executor.submit(_run_sweep_point, point) for point in points]
+            results = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = pd.DataFrame(results).sort_values('sharpe', ascending=False)
+    logging.info(f"Sweep Results:\n{results.to_string(index=False)}")
+    if export_file:
+        results.to_csv(export_file, index=False)
+        logging.info(f"Sweep results exported to {export_file}")
+    return results
 
 def interactive_menu():
     print("="*50)
@@ -184,6 +310,7 @@ def main():
 
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
+    apply_thread_limit()
 
     # Interactive menu if no CLI args
     if len(sys.argv) == 1:
@@ -211,6 +338,8 @@ def main():
                 break
             else:
                 print("Invalid choice. Try again.")
+    elif args.sweep:
+        run_sweep(config, config.get('sweep', DEFAULT_SWEEP_GRID), export_file=args.export)
     else:
         run_pipeline(config, show_plots=args.plot, export_file=args.export)
 
@@ -219,8 +348,8 @@ def main():
     # custom_strategy = CustomStrategy(params)
     # signals = custom_strategy.generate_signals(data)
     # weights = pf.position_sizing(signals, config['max_position_size'])
-    # equity_curve, net_returns, turnover = bt.backtest(data, weights, config['initial_capital'], config['transaction_cost'])
-    # print_metrics_summary(net_returns, equity_curve)
+    # equity_curve, net_returns, turnover, max_dd = bt.backtest(data.arr, weights, config['initial_capital'], config['transaction_cost'])
+    # print_metrics_summary(net_returns, equity_curve, max_dd)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,77 @@
 import numpy as np
+from numba import njit
 
-def sharpe_ratio(returns, risk_free_rate=0):
-    excess = returns - risk_free_rate / 252
-    return np.sqrt(252) * excess.mean() / excess.std()
+@njit(cache=True)
+def drawdown_step(equity, running_max, max_dd):
+    # NaN until the first valid equity point, so empty input has no drawdown
+    if np.isnan(equity):
+        return running_max, max_dd
+    if equity > running_max:
+        running_max = equity
+    dd = equity / running_max - 1.0
+    if not dd >= max_dd:
+        max_dd = dd
+    return running_max, max_dd
+
+@njit(cache=True)
+def drawdown_kernel(equity):
+    running_max = -np.inf
+    max_dd = np.nan
+    for i in range(equity.shape[0]):
+        running_max, max_dd = drawdown_step(equity[i], running_max, max_dd)
+    return max_dd
+
+@njit(cache=True)
+def return_stats(returns):
+    # Welford mean/M2 rather than sum and sum of squares, which cancel badly
+    mean = 0.0
+    m2 = 0.0
+    n = 0
+    wins = 0
+    for i in range(returns.shape[0]):
+        r = returns[i]
+        if np.isnan(r):
+            continue
+        n += 1
+        delta = r - mean
+        mean += delta / n
+        m2 += delta * (r - mean)
+        if r > 0:
+            wins += 1
+    return mean, m2, n, wins
+
+def _as_array(x):
+    return np.ascontiguousarray(np.asarray(x, dtype=np.float64))
+
+def sharpe_ratio(returns, risk_free_rate=0, stats=None):
+    if stats is None:
+        stats = return_stats(_as_array(returns))
+    mean, m2, n, _ = stats
+    if n < 2:
+        return np.nan
+    std = np.sqrt(m2 / (n - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(252) * np.float64(mean - risk_free_rate / 252) / std
 
 def max_drawdown(equity_curve):
-    roll_max = equity_curve.cummax()
-    drawdown = equity_curve / roll_max - 1.0
-    return drawdown.min()
+    return drawdown_kernel(_as_array(equity_curve))
+
+def win_rate(returns, stats=None):
+    if stats is None:
+        stats = return_stats(_as_array(returns))
+    _, _, n, wins = stats
+    if n == 0:
+        return np.nan
+    return wins / n
 
-def win_rate(returns):
-    return (returns > 0).mean()
+def performance_metrics(returns, max_dd):
+    # max_dd comes from the backtest kernel or max_drawdown; the return moments are computed once
+    stats = return_stats(_as_array(returns))
+    return {
+        'sharpe': sharpe_ratio(returns, stats=stats),
+        'max_drawdown': max_dd,
+        'win_rate': win_rate(returns, stats=stats),
+    }
 
 if __name__ == "__main__":
     import data_loader
@@ -20,11 +81,11 @@ if __name__ == "__main__":
     config = data_loader.load_config()
     data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = data_loader.preprocess_data(data)
-    zscores = sig.compute_zscore(data, config['lookback_window'])
+    zscores = sig.compute_zscore(data.arr, config['lookback_window'])
     signals = sig.generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
     weights = pf.position_sizing(signals, config['max_position_size'])
-    eq, net_ret, turnover = bt.backtest(data, weights, config['initial_capital'], config['transaction_cost'])
+    eq, net_ret, turnover, max_dd = bt.backtest(data.arr, weights, config['initial_capital'], config['transaction_cost'])
     print("Sharpe:", sharpe_ratio(net_ret))
-    print("Max DD:", max_drawdown(eq))
+    print("Max DD:", max_dd)
     print("Win Rate:", win_rate(net_ret))
 
@@ -1,15 +1,18 @@
-import pandas as pd
 import numpy as np
+from numba import vectorize
+
+@vectorize(['float32(int64, float64)'], cache=True)
+def position_scale(active, max_position_size):
+    if active == 0:
+        return np.float32(0.0)
+    return np.float32(max_position_size / active)
 
 def position_sizing(signals, max_position_size):
-    n_assets = len(signals.columns)
-    weights = signals.copy()
-    for date in signals.index:
-        active = signals.loc[date].abs().sum()
-        if active == 0:
-            weights.loc[date] = 0
-        else:
-            weights.loc[date] = signals.loc[date] * (max_position_size / active)
+    active = np.abs(signals).sum(axis=1, dtype=np.int64)
+    # LLVM if-converts the zero check, so empty rows raise the divide flag even though the quotient is discarded
+    with np.errstate(divide='ignore'):
+        scale = position_scale(active, float(max_position_size))
+    weights = signals.astype(np.float32) * scale[:, None]
     return weights
 
 if __name__ == "__main__":
@@ -18,7 +21,7 @@ if __name__ == "__main__":
     config = data_loader.load_config()
     data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = data_loader.preprocess_data(data)
-    zscores = sig.compute_zscore(data, config['lookback_window'])
+    zscores = sig.compute_zscore(data.arr, config['lookback_window'])
     signals = sig.generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
     weights = position_sizing(signals, config['max_position_size'])
-    print(weights.tail())
+    print(data.to_frame(weights).tail())
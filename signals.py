@@ -1,41 +1,101 @@
-import pandas as pd
+import numpy as np
+from numba import njit, prange
+
+@njit(parallel=True, cache=True)
+def rolling_zscore(arr, window):
+    n_rows, n_cols = arr.shape
+    out = np.full((n_rows, n_cols), np.nan)
+    inv_window = 1.0 / window
+    inv_dof = 1.0 / (window - 1) if window > 1 else 0.0
+    for j in prange(n_cols):
+        count = 0
+        nan_count = 0
+        mean = 0.0
+        m2 = 0.0
+        # Length of the run of equal values ending at row i, as pandas counts it for flat windows
+        run = 0
+        prev = np.nan
+        for i in range(n_rows):
+            x = arr[i, j]
+            run = run + 1 if x == prev else (0 if np.isnan(x) else 1)
+            prev = x
+            old = arr[i - window, j] if i >= window else np.nan
+            if count == window and not np.isnan(x) and not np.isnan(old):
+                # Full window sliding by one: fixed-size Welford replace, no division by count
+                delta = x - old
+                prev_mean = mean
+                mean += delta * inv_window
+                m2 += delta * (x - mean + old - prev_mean)
+            else:
+                if np.isnan(x):
+                    nan_count += 1
+                else:
+                    # Welford add
+                    count += 1
+                    delta = x - mean
+                    mean += delta / count
+                    m2 += delta * (x - mean)
+                if i >= window:
+                    if np.isnan(old):
+                        nan_count -= 1
+                    else:
+                        # Welford remove
+                        count -= 1
+                        if count == 0:
+                            mean = 0.0
+                            m2 = 0.0
+                        else:
+                            delta = old - mean
+                            mean -= delta / count
+                            m2 -= delta * (old - mean)
+            if run >= window:
+                # Flat window: M2 can keep rounding residue from earlier moves, so
+                # reset it and leave the z-score NaN (std is exactly 0)
+                mean = x
+                m2 = 0.0
+            elif i >= window - 1 and nan_count == 0 and window > 1:
+                std = np.sqrt(max(m2, 0.0) * inv_dof)
+                if std > 0:
+                    out[i, j] = (x - mean) / std
+    return out
 
 def compute_zscore(prices, window):
-    rolling_mean = prices.rolling(window=window).mean()
-    rolling_std = prices.rolling(window=window).std()
-    zscore = (prices - rolling_mean) / rolling_std
-    return zscore
+    return rolling_zscore(prices, window)
 
-def generate_signals(zscores, entry_z, exit_z):
-    signals = pd.DataFrame(index=zscores.index, columns=zscores.columns)
-    positions = pd.DataFrame(0, index=zscores.index, columns=zscores.columns)
-    for asset in zscores.columns:
-        long = (zscores[asset] < -entry_z).astype(int)
-        exit_long = (zscores[asset] > -exit_z).astype(int)
-        short = (zscores[asset] > entry_z).astype(int)
-        exit_short = (zscores[asset] < exit_z).astype(int)
+@njit(cache=True)
+def next_position(position, z, entry_z, exit_z):
+    if position == 0:
+        if z < -entry_z:
+            return 1
+        if z > entry_z:
+            return -1
+    elif position == 1:
+        if z > -exit_z:
+            return 0
+    elif position == -1:
+        if z < exit_z:
+            return 0
+    return position
+
+@njit(parallel=True, cache=True)
+def generate_signals_kernel(zscores, entry_z, exit_z):
+    n_rows, n_cols = zscores.shape
+    out = np.zeros((n_rows, n_cols), dtype=np.int8)
+    for j in prange(n_cols):
         position = 0
-        for i in range(len(zscores)):
-            if position == 0:
-                if long.iloc[i]:
-                    position = 1
-                elif short.iloc[i]:
-                    position = -1
-            elif position == 1:
-                if exit_long.iloc[i]:
-                    position = 0
-            elif position == -1:
-                if exit_short.iloc[i]:
-                    position = 0
-            positions.iloc[i][asset] = position
-        signals[asset] = positions[asset]
-    return signals
+        for i in range(n_rows):
+            position = next_position(position, zscores[i, j], entry_z, exit_z)
+            out[i, j] = position
+    return out
+
+def generate_signals(zscores, entry_z, exit_z):
+    return generate_signals_kernel(zscores, float(entry_z), float(exit_z))
 
 if __name__ == "__main__":
     import data_loader
     config = data_loader.load_config()
     data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = data_loader.preprocess_data(data)
-    zscores = compute_zscore(data, config['lookback_window'])
+    zscores = compute_zscore(data.arr, config['lookback_window'])
     signals = generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
-    print(signals.tail())
+    print(data.to_frame(signals).tail())
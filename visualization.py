@@ -1,16 +1,27 @@
+import os
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-def plot_equity_curve(equity_curve):
+PLOT_DIR = 'out'
+
+def _finish(path):
+    if path:
+        plt.savefig(path)
+        plt.close()
+    else:
+        plt.show()
+
+def plot_equity_curve(equity_curve, path=None):
     plt.figure(figsize=(12,6))
     plt.plot(equity_curve)
     plt.title('Equity Curve')
     plt.xlabel('Date')
     plt.ylabel('Portfolio Value')
     plt.grid(True)
-    plt.show()
+    _finish(path)
 
-def plot_drawdown(equity_curve):
+def plot_drawdown(equity_curve, path=None):
     roll_max = equity_curve.cummax()
     drawdown = equity_curve / roll_max - 1.0
     plt.figure(figsize=(12,4))
@@ -19,28 +30,38 @@ def plot_drawdown(equity_curve):
     plt.xlabel('Date')
     plt.ylabel('Drawdown')
     plt.grid(True)
-    plt.show()
+    _finish(path)
 
-def plot_signal_heatmap(signals):
+def plot_signal_heatmap(signals, path=None):
     plt.figure(figsize=(12,6))
     sns.heatmap(signals.T, cmap='RdBu', center=0)
     plt.title('Signal Heatmap')
     plt.xlabel('Date')
     plt.ylabel('Asset')
-    plt.show()
+    _finish(path)
+
+def save_plot(plot_fn, data, name, out_dir=PLOT_DIR):
+    # Agg renders straight to PNG in-process; no GUI window blocks the pipeline
+    matplotlib.use('Agg', force=True)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}.png")
+    plot_fn(data, path)
+    return path
 
 if __name__ == "__main__":
     import data_loader
     import signals as sig
     import portfolio as pf
     import backtester as bt
+    import pandas as pd
     config = data_loader.load_config()
     data = data_loader.fetch_data(config['assets'], config['start_date'], config['end_date'])
     data = data_loader.preprocess_data(data)
-    zscores = sig.compute_zscore(data, config['lookback_window'])
+    zscores = sig.compute_zscore(data.arr, config['lookback_window'])
     signals = sig.generate_signals(zscores, config['entry_zscore'], config['exit_zscore'])
     weights = pf.position_sizing(signals, config['max_position_size'])
-    eq, net_ret, turnover = bt.backtest(data, weights, config['initial_capital'], config['transaction_cost'])
+    eq, net_ret, turnover, max_dd = bt.backtest(data.arr, weights, config['initial_capital'], config['transaction_cost'])
+    eq = pd.Series(eq, index=data.index)
     plot_equity_curve(eq)
     plot_drawdown(eq)
-    plot_signal_heatmap(signals)
+    plot_signal_heatmap(data.to_frame(signals))